@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel
+import numpy as np
 import os
 import time
 import threading
@@ -12,6 +14,53 @@ os.environ['TRANSFORMERS_CACHE'] = "D:/AI/hugging_faces"
 os.environ['HF_HOME'] = "D:/AI/hugging_faces"
 
 
+class SmallModelDraft(LlamaDraftModel):
+    """Draft model for speculative decoding: a small GGUF proposes tokens the main model verifies.
+
+    The draft model must share the main model's tokenizer (e.g. a small Qwen2.5
+    model for the DeepSeek-R1-Distill-Qwen models). Acceptance is measured by
+    checking how many proposed tokens show up in the next prompt llama.cpp hands us.
+    """
+
+    def __init__(self, llm, num_pred_tokens=8):
+        self.llm = llm
+        self.num_pred_tokens = num_pred_tokens
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.proposed = 0
+        self.accepted = 0
+        self.last_input = None
+        self.last_draft = []
+
+    def acceptance_rate(self):
+        return self.accepted / self.proposed if self.proposed else 0.0
+
+    def __call__(self, input_ids, **kwargs):
+        # Count how many tokens of the previous draft the main model kept
+        if self.last_input is not None and len(input_ids) > len(self.last_input) \
+                and np.array_equal(input_ids[:len(self.last_input)], self.last_input):
+            for drafted, kept in zip(self.last_draft, input_ids[len(self.last_input):]):
+                if drafted != kept:
+                    break
+                self.accepted += 1
+
+        draft = []
+        try:
+            for token in self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, reset=True):
+                draft.append(token)
+                if len(draft) >= self.num_pred_tokens:
+                    break
+        except Exception as e:
+            print(f"Draft model error, continuing without speculation: {str(e)}")
+            draft = []
+
+        self.proposed += len(draft)
+        self.last_input = np.array(input_ids, copy=True)
+        self.last_draft = draft
+        return np.array(draft, dtype=np.intc)
+
+
 class ChatApplication:
     def __init__(self, root):
         self.root = root
@@ -33,6 +82,13 @@ class ChatApplication:
         self.model_name = "mradermacher/DeepSeek-R1-Distill-Qwen-14B-abliterated-v2-GGUF"
         self.model_filename = "DeepSeek-R1-Distill-Qwen-14B-abliterated-v2.Q6_K.gguf"
 
+        # Optional speculative decoding (set draft_model_name to None to disable)
+        self.draft_model_name = "Qwen/Qwen2.5-0.5B-Instruct-GGUF"
+        self.draft_model_filename = "qwen2.5-0.5b-instruct-q8_0.gguf"
+        self.draft_tokens = 8  # tokens proposed per verification batch
+        self.draft = None
+        self.last_stats = None
+
         # Create UI elements
         self.create_widgets()
 
@@ -149,6 +205,23 @@ class ChatApplication:
             else:
                 print("CUDA not available. Using CPU.")
 
+            # Load the small draft model first; the main model needs it at construction time
+            if self.draft_model_name:
+                try:
+                    draft_llm = Llama.from_pretrained(
+                        repo_id=self.draft_model_name,
+                        filename=self.draft_model_filename,
+                        n_gpu_layers=-1,  # Small enough to fit next to the main model
+                        n_ctx=4096,
+                        n_threads=8,
+                        verbose=False
+                    )
+                    self.draft = SmallModelDraft(draft_llm, num_pred_tokens=self.draft_tokens)
+                    print(f"Speculative decoding enabled with {self.draft_model_filename} ({self.draft_tokens} draft tokens)")
+                except Exception as e:
+                    self.draft = None
+                    self.append_to_chat(f"Draft model unavailable, decoding without speculation: {str(e)}", 'system')
+
             # Load the model (do not call .to())
             self.llm = Llama.from_pretrained(
                 repo_id=self.model_name,
@@ -156,6 +229,7 @@ class ChatApplication:
                 n_gpu_layers=35,  # Adjust based on your GPU capacity (6GB VRAM)
                 n_batch=256,  # Reduce if you encounter memory issues
                 n_threads=8,  # Optimized for CPU threading
+                draft_model=self.draft,
                 verbose=True
             )
 
@@ -214,6 +288,11 @@ class ChatApplication:
         threading.Thread(target=self.stream_response, args=(user_text,), daemon=True).start()
 
     def stream_response(self, user_text):
+        self.last_stats = None
+        if self.draft:
+            self.draft.reset_stats()
+        start_time = time.time()
+        token_count = 0
         try:
             response_generator = self.llm.create_chat_completion(
                 messages=[{"role": "user", "content": user_text}],
@@ -231,8 +310,14 @@ class ChatApplication:
 
                 chunk_content = chunk['choices'][0]['delta'].get('content', '')
                 if chunk_content:
+                    token_count += 1
                     self.response_queue.put(chunk_content)
 
+            elapsed = time.time() - start_time
+            self.last_stats = f"{token_count} tokens in {elapsed:.1f}s ({token_count / max(elapsed, 1e-6):.1f} tok/s)"
+            if self.draft:
+                self.last_stats += (f", draft accepted {self.draft.accepted}/{self.draft.proposed} tokens "
+                                    f"({self.draft.acceptance_rate():.0%})")
             self.response_queue.put(None)  # End of stream
         except Exception as e:
             self.response_queue.put(f"\n\nError: {str(e)}")
@@ -261,7 +346,7 @@ class ChatApplication:
         self.user_input.config(state='normal')
         self.send_button.config(state='normal')
         self.stop_button.config(state='disabled')
-        self.update_status("Ready")
+        self.update_status(f"Ready — {self.last_stats}" if self.last_stats else "Ready")
         self.append_to_chat("", 'assistant')  # Add spacing
 
     def stop_generation(self):
@@ -3,8 +3,30 @@ import streamlit as st
 import os
 import requests
 import random
+import re
+import hashlib
+import threading
+import time
+import io
+import codecs
+import zipfile
+import posixpath
+import uuid
+import itertools
+import html
+import shutil
+import unicodedata
+from array import array
+import json
+import zlib
+import mmap
+import xml.etree.ElementTree as ElementTree
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from collections import deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from google.cloud import translate_v2 as translate
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from plyer import notification
 
@@ -12,22 +34,40 @@ from plyer import notification
 # Load environment variables
 load_dotenv()
 
-SUPPORTED_LANGS = ["en", "vi"]
+SUPPORTED_LANGS = ["en", "vi", "ja", "ko", "zh", "fr", "de", "es", "ru"]
 LANG_NAMES = {
     "en": "English",
-    "vi": "Vietnamese"
+    "vi": "Vietnamese",
+    "zh": "Chinese",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "fr": "French",
+    "de": "German",
+    "es": "Spanish",
+    "ru": "Russian"
 }
 
 def init_session_state():
     session_defaults = {
-        "translations": {},
+        "job": None,
         "processing": False,
-        "source_text": "",
         "progress": 0,
         "resources": {"cpu": 0, "memory": 0},
         "source_lang": "en",
         "view_mode": "Side by Side",
         "quick_view": False,
+        "glossary_text": "",
+        "hedge_requests": False,
+        "source_lang_choice": "auto",
+        "prefer_quality": False,
+        "target_langs": ["en", "vi"],
+        "export_file": None,
+        "reader_page": 1,
+        "book": None,
+        "chapter_mode": False,
+        "prefetch_next": False,
+        "prefetches": {},
+        "prefetch_chars": 0,
     }
     for key, value in session_defaults.items():
         if key not in st.session_state:
@@ -48,65 +88,825 @@ def get_google_translate_client():
     except Exception as e:
         raise RuntimeError(f"Google client error: {str(e)}")
 
-def split_text(text, max_length=MAX_CHUNK_SIZE):
-    """Splits text into smaller chunks, keeping words intact."""
-    lines = text.split("\n")
-    chunks = []
+SENTENCE_ENDS = ".!?。！？…"
+
+def split_long_line(line, max_length=MAX_CHUNK_SIZE):
+    """Splits a line longer than max_length at sentence ends, falling back to spaces, then characters."""
+    while len(line) > max_length:
+        window = line[:max_length]
+        cut = max(window.rfind(mark) for mark in SENTENCE_ENDS) + 1
+        if cut <= max_length // 2:
+            cut = window.rfind(" ") + 1
+        if cut <= max_length // 2:
+            cut = max_length
+        yield line[:cut].rstrip()
+        line = line[cut:].lstrip()
+    yield line
+
+def iter_chunks(lines, max_length=MAX_CHUNK_SIZE):
+    """Streaming version of split_text: groups an iterable of lines into chunks."""
     current_chunk = ""
 
     for line in lines:
-        if len(current_chunk) + len(line) + 1 > max_length:
-            chunks.append(current_chunk)
-            current_chunk = line
-        else:
-            current_chunk += ("\n" if current_chunk else "") + line
+        for piece in split_long_line(line, max_length):
+            if len(current_chunk) + len(piece) + 1 > max_length:
+                if current_chunk.strip():
+                    yield current_chunk
+                current_chunk = piece
+            else:
+                current_chunk += ("\n" if current_chunk else "") + piece
+
+    if current_chunk.strip():
+        yield current_chunk
+
+def split_text(text, max_length=MAX_CHUNK_SIZE):
+    """Splits text into smaller chunks, keeping words intact."""
+    return list(iter_chunks(text.split("\n"), max_length))
+
+# File Upload Setup
+UPLOAD_TYPES = ["txt", "epub", "html", "htm"]
+UPLOAD_READ_SIZE = 64 * 1024
+OUTPUT_DIR = "translations_output"
+
+class ParagraphExtractor(HTMLParser):
+    """Collects the text of block-level HTML elements as paragraphs while being fed."""
+    BLOCK_TAGS = {"p", "div", "br", "h1", "h2", "h3", "h4", "h5", "h6", "li", "tr", "blockquote", "section", "article"}
+    SKIP_TAGS = {"head", "script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.paragraphs = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self.flush()
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+    def flush(self):
+        text = " ".join("".join(self.parts).split())
+        self.parts = []
+        if text:
+            self.paragraphs.append(text)
+
+    def drain(self):
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+def iter_html_paragraphs(stream):
+    """Yields paragraphs from an HTML/XHTML byte stream, one read block at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = ParagraphExtractor()
+    while True:
+        block = stream.read(UPLOAD_READ_SIZE)
+        if not block:
+            break
+        parser.feed(decoder.decode(block))
+        yield from parser.drain()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    parser.flush()
+    yield from parser.drain()
+
+def iter_epub_paragraphs(stream):
+    """Yields paragraphs from each EPUB spine document in reading order."""
+    with zipfile.ZipFile(stream) as book:
+        container = ElementTree.fromstring(book.read("META-INF/container.xml"))
+        opf_path = container.find(".//{*}rootfile").get("full-path")
+        package = ElementTree.fromstring(book.read(opf_path))
+        base_dir = posixpath.dirname(opf_path)
+        manifest = {item.get("id"): item.get("href") for item in package.findall(".//{*}manifest/{*}item")}
+
+        for itemref in package.findall(".//{*}spine/{*}itemref"):
+            href = manifest.get(itemref.get("idref"))
+            if not href:
+                continue
+            with book.open(posixpath.normpath(posixpath.join(base_dir, unquote(href)))) as document:
+                yield from iter_html_paragraphs(document)
+
+def iter_text_lines(stream):
+    """Yields lines from a plain-text byte stream without reading it all at once.
+
+    Lines longer than UPLOAD_READ_SIZE come out as several sentence-aligned pieces.
+    """
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace")
+    try:
+        # Lines are read in bounded pieces, so a file without line breaks is still split up
+        carry = ""
+        while True:
+            piece = reader.readline(UPLOAD_READ_SIZE)
+            if not piece:
+                break
+            if piece.endswith("\n"):
+                yield carry + piece.rstrip("\r\n")
+                carry = ""
+            else:
+                *complete, carry = split_long_line(carry + piece)
+                yield from complete
+        if carry:
+            yield carry
+    finally:
+        reader.detach()
+
+def iter_upload_lines(uploaded_file):
+    """Picks a streaming reader based on the uploaded file's extension."""
+    extension = os.path.splitext(uploaded_file.name)[1].lower().lstrip(".")
+    uploaded_file.seek(0)
+    if extension == "epub":
+        return iter_epub_paragraphs(uploaded_file)
+    if extension in ("html", "htm"):
+        return iter_html_paragraphs(uploaded_file)
+    return iter_text_lines(uploaded_file)
+
+# Result Store Setup
+STORE_DIR = os.path.join(OUTPUT_DIR, "store")
+STORE_BLOCK_LINES = 256
+STORE_RETENTION_DAYS = 14  # counted from the last time a job was read
+JOB_ID_PATTERN = re.compile(r"[\w-]+")
+
+def store_path(job_id, name):
+    return os.path.join(STORE_DIR, job_id, name)
+
+def touch_store(job_id):
+    """Marks a stored job as recently used so the retention policy keeps it."""
+    os.utime(os.path.join(STORE_DIR, job_id))
+
+class ResultStoreWriter:
+    """Appends lines per language as zlib-compressed blocks with an index for random access.
+
+    On close it also writes rows.bin, the line numbers that are not blank in
+    every language, which the reader uses as its paragraph alignment index.
+    """
+
+    def __init__(self, job_id, langs):
+        os.makedirs(os.path.join(STORE_DIR, job_id), exist_ok=True)
+        self.job_id = job_id
+        self.langs = list(langs)
+        self.files = {lang: open(store_path(job_id, f"{lang}.bin"), "wb") for lang in self.langs}
+        self.blocks = {lang: [] for lang in self.langs}
+        self.pending = {lang: [] for lang in self.langs}
+        self.masks = {lang: bytearray() for lang in self.langs}
+
+    def write_text(self, lang, text):
+        for line in text.split("\n"):
+            self.pending[lang].append(line)
+            self.masks[lang].append(1 if line.strip() else 0)
+            if len(self.pending[lang]) >= STORE_BLOCK_LINES:
+                self._flush_block(lang)
+
+    def write_aligned(self, texts):
+        """Writes one piece per language, padding with blank lines so the languages stay in step."""
+        line_counts = {lang: text.count("\n") + 1 for lang, text in texts.items()}
+        longest = max(line_counts.values())
+        for lang, text in texts.items():
+            self.write_text(lang, text + "\n" * (longest - line_counts[lang]))
+
+    def _flush_block(self, lang):
+        if not self.pending[lang]:
+            return
+        data = zlib.compress("\n".join(self.pending[lang]).encode("utf-8"))
+        output = self.files[lang]
+        self.blocks[lang].append((output.tell(), len(data)))
+        output.write(data)
+        self.pending[lang] = []
+
+    def close(self):
+        for lang in self.langs:
+            self._flush_block(lang)
+            self.files[lang].close()
+            with open(store_path(self.job_id, f"{lang}.json"), "w", encoding="utf-8") as index_file:
+                json.dump({"lines": len(self.masks[lang]), "block_lines": STORE_BLOCK_LINES, "blocks": self.blocks[lang]}, index_file)
+
+        total = max((len(mask) for mask in self.masks.values()), default=0)
+        masks = list(self.masks.values())
+        rows = array("I", (line for line in range(total) if any(line < len(mask) and mask[line] for mask in masks)))
+        with open(store_path(self.job_id, "rows.bin"), "wb") as rows_file:
+            rows.tofile(rows_file)
+
+class StoredText:
+    """Read-only, memory-mapped view of one language in the result store."""
+
+    def __init__(self, job_id, lang):
+        touch_store(job_id)
+        with open(store_path(job_id, f"{lang}.json"), encoding="utf-8") as index_file:
+            index = json.load(index_file)
+        self.line_count = index["lines"]
+        self.block_lines = index["block_lines"]
+        self.blocks = index["blocks"]
+        self.file = open(store_path(job_id, f"{lang}.bin"), "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.blocks else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def block(self, number):
+        offset, length = self.blocks[number]
+        return zlib.decompress(self.map[offset:offset + length]).decode("utf-8").split("\n")
+
+    def read_lines(self, start, stop):
+        """Lines [start, stop), decompressing only the blocks that hold them."""
+        stop = min(stop, self.line_count)
+        lines = []
+        if start >= stop:
+            return lines
+        for number in range(start // self.block_lines, (stop - 1) // self.block_lines + 1):
+            base = number * self.block_lines
+            lines.extend(self.block(number)[max(start, base) - base:stop - base])
+        return lines
+
+    def iter_lines(self):
+        for number in range(len(self.blocks)):
+            yield from self.block(number)
+
+def store_row_count(job_id):
+    touch_store(job_id)
+    return os.path.getsize(store_path(job_id, "rows.bin")) // array("I").itemsize
+
+def read_store_rows(job_id, first_row, count):
+    """Reads a slice of the alignment index without loading the rest of it."""
+    rows = array("I")
+    with open(store_path(job_id, "rows.bin"), "rb") as rows_file:
+        rows_file.seek(first_row * rows.itemsize)
+        rows.frombytes(rows_file.read(count * rows.itemsize))
+    return rows
+
+def save_job_info(job_id, info):
+    with open(store_path(job_id, "job.json"), "w", encoding="utf-8") as info_file:
+        json.dump(info, info_file)
+
+def load_job_info(job_id):
+    """Reads a stored job's metadata; None for unknown or malformed IDs, since they come from the URL."""
+    if not job_id or not JOB_ID_PATTERN.fullmatch(job_id):
+        return None
+    try:
+        with open(store_path(job_id, "job.json"), encoding="utf-8") as info_file:
+            info = json.load(info_file)
+    except (OSError, ValueError):
+        return None
+    touch_store(job_id)
+    return info
+
+def delete_store(job_id):
+    shutil.rmtree(os.path.join(STORE_DIR, job_id), ignore_errors=True)
+
+def prune_store(keep=()):
+    """Deletes stored jobs that have not been read for STORE_RETENTION_DAYS."""
+    if not os.path.isdir(STORE_DIR):
+        return
+    cutoff = time.time() - STORE_RETENTION_DAYS * 86400
+    for entry in os.scandir(STORE_DIR):
+        if entry.is_dir() and entry.name not in keep and entry.stat().st_mtime < cutoff:
+            delete_store(entry.name)
+
+# Glossary Setup
+GLOSSARY_PLACEHOLDER = "[#{}]"
+GLOSSARY_PLACEHOLDER_PATTERN = re.compile(r"\[\s*#\s*(\d+)\s*\]")
+
+def parse_glossary(raw_text):
+    """Parses 'source = target' lines into a list of (source, target) pairs."""
+    entries = {}
+    for line in raw_text.splitlines():
+        if "=" not in line or line.lstrip().startswith("#"):
+            continue
+        source, target = line.split("=", 1)
+        source, target = source.strip(), target.strip()
+        if source and target:
+            entries[source] = target
+    return list(entries.items())
+
+def glossary_version(entries):
+    """Returns a stable hash of the glossary, used as the automaton cache key."""
+    digest = hashlib.sha1()
+    for source, target in entries:
+        digest.update(f"{source}\x00{target}\x01".encode("utf-8"))
+    return digest.hexdigest()
+
+class GlossaryIndex:
+    """Aho-Corasick automaton over glossary terms for single-pass matching."""
+
+    def __init__(self, entries):
+        self.targets = [target for _, target in entries]
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [0]  # length of the longest term ending at each node
+        self.term_id = [-1]
+
+        for index, (source, _) in enumerate(entries):
+            node = 0
+            for char in source:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(0)
+                    self.term_id.append(-1)
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node] = len(source)
+            self.term_id[node] = index
+
+        self.best = list(range(len(self.goto)))  # node holding the longest term in the fail chain
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            if not self.output[node]:
+                self.best[node] = self.best[self.fail[node]]
+            for char, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                queue.append(child)
+
+    def find(self, text):
+        """Returns non-overlapping (start, end, term_id) matches, leftmost-longest first."""
+        matches = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            # Every term ending here is a candidate: a shorter one may fit where the longest overlaps
+            hit = self.best[node]
+            while self.output[hit]:
+                end = position + 1
+                start = end - self.output[hit]
+                if _is_term_boundary(text, start, end):
+                    matches.append((start, end, self.term_id[hit]))
+                hit = self.best[self.fail[hit]]
+
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        last_end = 0
+        for start, end, term in matches:
+            if start >= last_end:
+                selected.append((start, end, term))
+                last_end = end
+        return selected
+
+    def protect(self, text):
+        """Replaces glossary terms with numbered placeholders that survive translation."""
+        parts = []
+        last_end = 0
+        for start, end, term in self.find(text):
+            parts.append(text[last_end:start])
+            parts.append(GLOSSARY_PLACEHOLDER.format(term))
+            last_end = end
+        parts.append(text[last_end:])
+        return "".join(parts)
+
+    def restore(self, text):
+        """Swaps placeholders back for the glossary's target terms."""
+        def replace(match):
+            term = int(match.group(1))
+            return self.targets[term] if term < len(self.targets) else match.group(0)
+        return GLOSSARY_PLACEHOLDER_PATTERN.sub(replace, text)
+
+UNSPACED_SCRIPTS = ("CJK", "HIRAGANA", "KATAKANA", "HALFWIDTH KATAKANA", "HANGUL")
+
+def _is_word_char(char):
+    """Letters and digits of scripts that separate words; CJK, kana and Hangul never form boundaries."""
+    if char.isdigit():
+        return True
+    return char.isalpha() and not unicodedata.name(char, "").startswith(UNSPACED_SCRIPTS)
+
+def _is_term_boundary(text, start, end):
+    """Terms in spaced scripts (Latin, Cyrillic, ...) must match whole words; CJK terms can match anywhere."""
+    if start > 0 and _is_word_char(text[start]) and _is_word_char(text[start - 1]):
+        return False
+    if end < len(text) and _is_word_char(text[end - 1]) and _is_word_char(text[end]):
+        return False
+    return True
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_glossary_index(version, _entries):
+    """Compiles the glossary automaton once per glossary version."""
+    return GlossaryIndex(_entries)
+
+# Request Reliability Setup
+REQUEST_TIMEOUT = 60
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 20.0
+MAX_PARALLEL_CHUNKS = 4
+HEDGE_MIN_SAMPLES = 20
+CHUNK_CACHE_CHARS = 8000000  # total translated characters kept across all sessions
+ENGINE_RATE_LIMITS = {"deepl": 5.0, "google": 10.0}  # requests per second across all sessions
+
+class LatencyTracker:
+    """Keeps recent request latencies to decide when a request is running slow."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def p95(self):
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+class ChunkCache:
+    """Process-wide LRU of translated chunks so finished work survives a failed job."""
+
+    def __init__(self, max_chars=CHUNK_CACHE_CHARS):
+        self.entries = OrderedDict()
+        self.max_chars = max_chars
+        self.chars = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self.chars -= len(self.entries[key])
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.chars += len(value)
+            while self.chars > self.max_chars and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.chars -= len(evicted)
+
+class RateLimiter:
+    """Token bucket shared by every job and target that uses the same engine."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, low_priority=False):
+        # Low-priority callers (prefetch) leave half the bucket for interactive jobs
+        needed = 1 + (self.capacity / 2 if low_priority else 0)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= 1
+                    return
+                delay = (needed - self.tokens) / self.rate
+            time.sleep(delay)
+
+class InFlightRegistry:
+    """Single-flight calls: concurrent requests for the same key share one result."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def run(self, key, call):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+@st.cache_resource(show_spinner=False)
+def get_inflight_registry():
+    """Shared by every session in this server process."""
+    return InFlightRegistry()
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter(engine):
+    return RateLimiter(ENGINE_RATE_LIMITS[engine])
+
+@st.cache_resource(show_spinner=False)
+def get_latency_tracker(engine):
+    return LatencyTracker()
+
+@st.cache_resource(show_spinner=False)
+def get_chunk_cache():
+    return ChunkCache()
+
+@st.cache_resource(show_spinner=False)
+def get_request_pool():
+    """Shared pool for outgoing API requests, including hedged duplicates."""
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="translate-request")
+
+def chunk_key(engine, target_lang, chunk):
+    return (engine, target_lang.lower(), hashlib.sha1(chunk.encode("utf-8")).hexdigest())
+
+def is_retryable(error):
+    """Rate limits, server errors and network failures are retried.
+
+    Other 4xx errors (bad keys, exhausted quota, bad requests) and malformed
+    response bodies would fail the same way again, so they are raised at once.
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+    else:
+        # Google api_core errors carry the HTTP status as .code
+        status = getattr(error, "code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return not isinstance(error, (KeyError, IndexError, TypeError, ValueError))
+
+def call_with_retry(request):
+    """Runs a request, retrying transient failures with full-jitter exponential backoff."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return request()
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+
+def hedged_call(request, tracker, hedge=False, acquire=None):
+    """Sends a duplicate request once the primary exceeds the observed p95; first reply wins.
+
+    acquire takes a rate-limiter token for each request (the duplicate takes
+    its own) before it is submitted, and the hedge timer only starts once the
+    primary is running, so neither limiter waits nor pool queueing count
+    towards the p95 or trigger hedges.
+    """
+    started = threading.Event()
+
+    def timed():
+        started.set()
+        start = time.time()
+        result = request()
+        tracker.record(time.time() - start)
+        return result
+
+    pool = get_request_pool()
+    if acquire:
+        acquire()
+    primary = pool.submit(timed)
+    pending = {primary}
+    threshold = tracker.p95() if hedge else None
+    if threshold is not None:
+        started.wait()
+        done, _ = wait(pending, timeout=threshold)
+        if not done:
+            if acquire:
+                acquire()
+            if not primary.done():
+                pending.add(pool.submit(timed))
+
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+def translate_chunks(text_chunks, request_chunk, engine, target_lang, hedge=False, low_priority=False):
+    """Translates chunks concurrently with per-chunk retry, keeping finished chunks cached.
+
+    Identical chunks already being requested by another job or session are
+    awaited instead of being sent again.
+    """
+    cache = get_chunk_cache()
+    tracker = get_latency_tracker(engine)
+    limiter = get_rate_limiter(engine)
+    inflight = get_inflight_registry()
+
+    def translate_one(chunk):
+        key = chunk_key(engine, target_lang, chunk)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        def fetch():
+            # Re-check: a call for this key may have finished since the lookup above
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            translated = call_with_retry(
+                lambda: hedged_call(lambda: request_chunk(chunk), tracker, hedge, lambda: limiter.acquire(low_priority))
+            )
+            cache.put(key, translated)
+            return translated
+
+        return inflight.run(key, fetch)
 
-    if current_chunk:
-        chunks.append(current_chunk)
+    with ThreadPoolExecutor(max_workers=1 if low_priority else MAX_PARALLEL_CHUNKS) as executor:
+        futures = [executor.submit(translate_one, chunk) for chunk in text_chunks]
+        wait(futures)
 
-    return chunks
+    failed = [(index, future.exception()) for index, future in enumerate(futures, start=1) if future.exception()]
+    if failed:
+        index, error = failed[0]
+        kept = len(futures) - len(failed)
+        raise RuntimeError(
+            f"chunk {index}/{len(futures)} failed after retries ({kept} finished chunks kept for the next attempt): {str(error)}"
+        ) from error
+    return [future.result() for future in futures]
 
-def translate_with_google(text, target_lang):
+def translate_with_google(text, target_lang, hedge=False, low_priority=False):
     """Translates text using Google Translate API with chunking."""
     try:
         client = get_google_translate_client()
-        text_chunks = split_text(text)
 
-        translated_chunks = []
-        for chunk in text_chunks:
+        def request_chunk(chunk):
             translated = client.translate(
                 values=chunk,
                 target_language=target_lang,
                 format_='text'
             )
-            translated_chunks.append(translated['translatedText'])
+            return translated['translatedText']
 
+        translated_chunks = translate_chunks(split_text(text), request_chunk, "google", target_lang, hedge, low_priority)
         return "\n".join(translated_chunks)
     except Exception as e:
         return f"Google Error: {str(e)}"
 
-def translate_with_deepl(text, target_lang):
+def translate_with_deepl(text, target_lang, hedge=False, low_priority=False):
     """Translates text using DeepL API with chunking."""
     try:
-        text_chunks = split_text(text)
-        translated_chunks = []
-
-        for chunk in text_chunks:
+        def request_chunk(chunk):
             response = requests.post(
                 DEEPL_API_URL,
                 data={
                     "auth_key": DEEPL_API_KEY,
                     "text": chunk,
                     "target_lang": target_lang.upper()
-                }
+                },
+                timeout=REQUEST_TIMEOUT
             )
             response.raise_for_status()
-            translated_chunks.append(response.json()["translations"][0]["text"])
+            return response.json()["translations"][0]["text"]
 
+        translated_chunks = translate_chunks(split_text(text), request_chunk, "deepl", target_lang, hedge, low_priority)
         return "\n".join(translated_chunks)
     except Exception as e:
         return f"DeepL Error: {str(e)}"
 
+# Route Planning Setup
+ENGINE_NAMES = {"deepl": "DeepL", "google": "Google"}
+ENGINE_CHARS_PER_SECOND = {"deepl": 1500, "google": 4000}  # rough throughput for estimates
+VIETNAMESE_CHARS = set(
+    "ăâđêôơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịĩọỏốồổỗộớờởỡợụủũứừửữựỳỵỷỹ"
+    "ĂÂĐÊÔƠƯẠẢẤẦẨẪẬẮẰẲẴẶẸẺẼẾỀỂỄỆỈỊĨỌỎỐỒỔỖỘỚỜỞỠỢỤỦŨỨỪỬỮỰỲỴỶỸ"
+)
+ENGLISH_STOPWORDS = {"the", "and", "of", "to", "a", "in", "is", "was", "he", "she", "it", "that", "you", "i"}
+
+def detect_language(text, sample_size=2000):
+    """Cheap script-based language guess on a sample of the text; None if unsure."""
+    sample = text[:sample_size]
+    counts = {"ja": 0, "ko": 0, "zh": 0, "ru": 0, "vi": 0, "latin": 0}
+    for char in sample:
+        code = ord(char)
+        if 0x3040 <= code <= 0x30FF:
+            counts["ja"] += 1
+        elif 0xAC00 <= code <= 0xD7AF:
+            counts["ko"] += 1
+        elif 0x4E00 <= code <= 0x9FFF:
+            counts["zh"] += 1
+        elif 0x0400 <= code <= 0x04FF:
+            counts["ru"] += 1
+        elif char in VIETNAMESE_CHARS:
+            counts["vi"] += 1
+        elif char.isascii() and char.isalpha():
+            counts["latin"] += 1
+
+    # Japanese mixes kana with kanji, so any real amount of kana wins over Chinese
+    if counts["ja"] and counts["ja"] * 20 >= counts["zh"]:
+        return "ja"
+    script, count = max(((lang, counts[lang]) for lang in ("ko", "zh", "ru")), key=lambda item: item[1])
+    if count and count >= counts["latin"]:
+        return script
+    if counts["vi"] and counts["vi"] * 50 >= counts["latin"]:
+        return "vi"
+    words = re.findall(r"[a-z']+", sample.lower())
+    if words and sum(word in ENGLISH_STOPWORDS for word in words) * 10 >= len(words):
+        return "en"
+    return None
+
+def plan_route(source_lang, src_chars, targets=("en", "vi"), deepl_ok=True, google_ok=True, prefer_quality=False):
+    """Picks the cheapest available hops to produce every target language.
+
+    Each hop is a dict with the target language, the engine (None means the
+    source is already in that language) and which text it reads from. The
+    English hop always comes first since the other targets may pivot on it.
+
+    Candidates are the direct route (every target from the source) and, when
+    DeepL can produce English, the full pivot (other targets from DeepL's
+    English). The one with the fewest billed characters wins, then the faster
+    one. prefer_quality keeps the pivot whenever it is available, since
+    Google usually does better from English than from CJK sources.
+    """
+    use_deepl = deepl_ok and source_lang not in ("en", "vi")
+    others = [lang for lang in targets if lang != "en"]
+
+    def build_hops(pivot_on_english):
+        hops = []
+        if "en" in targets or pivot_on_english:
+            if source_lang == "en":
+                hops.append({"target": "en", "engine": None, "input": "source"})
+            elif use_deepl:
+                hops.append({"target": "en", "engine": "deepl", "input": "source"})
+            elif google_ok:
+                hops.append({"target": "en", "engine": "google", "input": "source"})
+            else:
+                raise ValueError("No translation engine available: add a DeepL key or Google credentials")
+
+        for lang in others:
+            if lang == source_lang:
+                hops.append({"target": lang, "engine": None, "input": "source"})
+            elif not google_ok:
+                raise ValueError(f"Google credentials are required to translate into {LANG_NAMES[lang]}")
+            else:
+                hops.append({"target": lang, "engine": "google", "input": "en" if pivot_on_english else "source"})
+        return hops
+
+    # The English hop runs first, then every other target is translated concurrently
+    def hop_seconds(hop):
+        return src_chars / ENGINE_CHARS_PER_SECOND[hop["engine"]] if hop["engine"] else 0.0
+
+    def estimate(hops):
+        pivot_hops = [hop for hop in hops if hop["input"] == "en"]
+        first_hops = [hop for hop in hops if hop["input"] == "source"]
+        seconds = max(map(hop_seconds, first_hops), default=0.0) + max(map(hop_seconds, pivot_hops), default=0.0)
+        return sum(src_chars for hop in hops if hop["engine"]), seconds
+
+    candidates = [build_hops(pivot_on_english=False)]
+    if (use_deepl or source_lang == "en") and any(lang != source_lang for lang in others):
+        candidates.append(build_hops(pivot_on_english=True))
+    if prefer_quality:
+        hops = candidates[-1]
+    else:
+        hops = min(candidates, key=estimate)
+    billed_chars, seconds = estimate(hops)
+
+    if any(hop["engine"] is None for hop in hops):
+        name = "Skip a hop"
+    elif any(hop["input"] == "en" for hop in hops):
+        name = "Full pivot"
+    else:
+        name = "Direct"
+
+    baseline_seconds = src_chars / ENGINE_CHARS_PER_SECOND["deepl"] + (src_chars / ENGINE_CHARS_PER_SECOND["google"] if others else 0.0)
+    return {
+        "name": name,
+        "source_lang": source_lang,
+        "hops": hops,
+        "billed_chars": billed_chars,
+        "est_seconds": seconds,
+        "saved_chars": max(0, src_chars * (1 + len(others)) - billed_chars),
+        "saved_seconds": max(0.0, baseline_seconds - seconds),
+    }
+
+def describe_route(route):
+    """Human-readable summary like 'DeepL: auto → EN, Google: EN → VI'."""
+    steps = []
+    for hop in route["hops"]:
+        origin = (route["source_lang"] or "auto") if hop["input"] == "source" else hop["input"]
+        if hop["engine"] is None:
+            steps.append(f"{hop['target'].upper()}: reuse source")
+        else:
+            steps.append(f"{ENGINE_NAMES[hop['engine']]}: {origin.upper()} → {hop['target'].upper()}")
+    return ", ".join(steps)
+
+ENGINE_TRANSLATORS = {"deepl": translate_with_deepl, "google": translate_with_google}
+
 def notify_completion():
     notification.notify(
         title="Translation Complete",
@@ -122,60 +922,140 @@ import streamlit as st
 import time
 import streamlit as st
 
+def plan_translation(src_text, total_chars=None):
+    """Detects the source language and plans the route using the engines that are configured."""
+    source_lang = st.session_state.get("source_lang_choice", "auto")
+    if source_lang == "auto":
+        source_lang = detect_language(src_text)
+    return plan_route(
+        source_lang,
+        total_chars if total_chars is not None else len(src_text),
+        targets=st.session_state.get("target_langs") or ["en", "vi"],
+        deepl_ok=bool(DEEPL_API_KEY),
+        google_ok=os.path.exists('google-credentials.json'),
+        prefer_quality=st.session_state.get("prefer_quality", False)
+    )
+
+def show_route(route):
+    st.info(
+        f"🧭 Route: **{route['name']}** ({describe_route(route)})\n\n"
+        f"Estimated {route['billed_chars']:,} billed characters, ~{route['est_seconds']:.0f} sec"
+        + (f" — saves {route['saved_chars']:,} characters and ~{route['saved_seconds']:.0f} sec vs. the full pivot"
+           if route["saved_chars"] else "")
+    )
+
+def load_glossary():
+    """Returns the compiled glossary index for the sidebar glossary, or None if it is empty."""
+    glossary_entries = parse_glossary(st.session_state.get("glossary_text", ""))
+    if not glossary_entries:
+        return None
+    return get_glossary_index(glossary_version(glossary_entries), glossary_entries)
+
+def run_route(route, src_text, glossary=None, hedge=False, on_hop=None, low_priority=False):
+    """Runs every hop of a planned route over one piece of text.
+
+    Hops reading the same input are translated concurrently, so all targets
+    that pivot on English run side by side once the English hop is done.
+    Returns the translations per language and (label, seconds) timings.
+    Glossary terms are protected before the first hop and restored after each one.
+    """
+    raw_texts = {"source": glossary.protect(src_text) if glossary else src_text}
+    translations = {}
+    timings = []
+    step = 0
+
+    def run_hop(hop):
+        start = time.time()
+        translated = ENGINE_TRANSLATORS[hop["engine"]](raw_texts[hop["input"]], hop["target"], hedge=hedge, low_priority=low_priority)
+        if translated.startswith(f"{ENGINE_NAMES[hop['engine']]} Error"):
+            raise ValueError(translated)
+        return translated, time.time() - start
+
+    for stage in ("source", "en"):
+        stage_hops = [hop for hop in route["hops"] if hop["input"] == stage]
+        engine_hops = [hop for hop in stage_hops if hop["engine"]]
+        for hop in stage_hops:
+            if hop["engine"] is None:
+                raw_texts[hop["target"]] = raw_texts["source"]
+                translations[hop["target"]] = src_text
+                step += 1
+                if on_hop:
+                    on_hop(step, hop, src_text)
+        if not engine_hops:
+            continue
+
+        # Streamlit calls stay on this thread; workers only talk to the APIs
+        with ThreadPoolExecutor(max_workers=len(engine_hops)) as executor:
+            futures = {executor.submit(run_hop, hop): hop for hop in engine_hops}
+            for future in as_completed(futures):
+                hop = futures[future]
+                translated, elapsed = future.result()
+                raw_texts[hop["target"]] = translated
+                translations[hop["target"]] = glossary.restore(translated) if glossary else translated
+                timings.append((f"{ENGINE_NAMES[hop['engine']]} ({LANG_NAMES[hop['target']]})", elapsed))
+                step += 1
+                if on_hop:
+                    on_hop(step, hop, translations[hop["target"]])
+
+    return {hop["target"]: translations[hop["target"]] for hop in route["hops"]}, timings
+
+def new_job_id(prefix=""):
+    """Returns a fresh job ID, pruning expired jobs (other than this session's) from the store first."""
+    prune_store(keep={item["id"] for item in (st.session_state.job, st.session_state.book) if item})
+    return f"{prefix}{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def set_job(job):
+    """Makes job the session's result and records it on disk and in the URL so it can be reopened."""
+    st.session_state.job = job
+    save_job_info(job["id"], job)
+    st.query_params["job"] = job["id"]
+
 def handle_translation(src_text):
     """Improved translation flow with detailed progress and real-time updates to keep the user engaged."""
     if not src_text.strip():
         st.warning("Please input text to translate.")
         return
 
+    try:
+        route = plan_translation(src_text)
+    except ValueError as e:
+        st.error(f"Translation failed: {str(e)}")
+        return
+
     st.session_state.processing = True
-    st.session_state.source_text = src_text
-    st.session_state.translations = {}
+    st.session_state.source_lang = route["source_lang"] or "auto"
+    st.session_state.job = None
+    discard_export_file()
+    show_route(route)
 
     progress_bar = st.progress(0)  # Initialize progress bar
     status_text = st.empty()  # Placeholder for status updates
     log_area = st.empty()  # Placeholder for verbose logs
 
     total_chars = len(src_text)
+    hedge = st.session_state.get("hedge_requests", False)
     start_time = time.time()
 
+    def on_hop(step, hop, translated):
+        if hop["engine"] is None:
+            log_area.text(f"⏭ Source is already {LANG_NAMES[hop['target']]}, skipping this hop")
+        else:
+            log_area.text(f"✅ {ENGINE_NAMES[hop['engine']]} translation completed\n📄 Text length: {len(translated)} chars")
+        progress_bar.progress(int(step * 100 / len(route["hops"])))
+
     try:
         with st.spinner("Processing translations..."):
-            # Check credentials first
-            if not DEEPL_API_KEY:
-                raise ValueError("DeepL API key not found in .env file")
-
-            if not os.path.exists('google-credentials.json'):
-                raise FileNotFoundError("Google credentials file not found")
-
             log_area.text(f"📜 Source text length: {total_chars} characters")
-
-            # Step 1: DeepL Translation
-            start = time.time()
-            status_text.text("🌐 Translating to English using DeepL...")
-            en_translation = translate_with_deepl(src_text, "EN")
-            deepl_elapsed = time.time() - start
-            progress_bar.progress(33)  # Update to 33% after DeepL translation
-            log_area.text(f"✅ DeepL translation completed in {deepl_elapsed:.2f} sec\n📄 Text length: {len(en_translation)} chars")
-            if en_translation.startswith("DeepL Error"):
-                raise ValueError(en_translation)
-            st.session_state.translations["en"] = en_translation
-
-            # Step 2: Google Translation
-            start = time.time()
-            status_text.text("🌏 Translating English to Vietnamese with Google...")
-            vi_translation = translate_with_google(en_translation, "vi")
-            google_elapsed = time.time() - start
-            progress_bar.progress(66)  # Update to 66% after Google translation
-            log_area.text(f"✅ Google translation done in {google_elapsed:.2f} sec\n📄 Text length: {len(vi_translation)} chars")
-            if vi_translation.startswith("Google Error"):
-                raise ValueError(vi_translation)
-            st.session_state.translations["vi"] = vi_translation
-
-            # Step 3: Finalizing
-            progress_bar.progress(100)  # Update to 100% once the translations are complete
+            status_text.text(f"🌐 Translating: {describe_route(route)}...")
+            translations, hop_timings = run_route(route, src_text, load_glossary(), hedge, on_hop)
             status_text.text("✅ Finalizing translations...")
 
+            # Keep the texts on disk; the session only remembers the job ID
+            job_id = new_job_id()
+            writer = ResultStoreWriter(job_id, ["source"] + list(translations))
+            writer.write_aligned({"source": src_text, **translations})
+            writer.close()
+
     except Exception as e:
         st.error(f"Translation failed: {str(e)}")
         st.session_state.processing = False
@@ -183,33 +1063,500 @@ def handle_translation(src_text):
 
     total_elapsed = time.time() - start_time
     st.session_state.processing = False
+    set_job({"id": job_id, "name": None, "langs": list(translations), "chunks": None, "complete": True})
+    st.session_state.reader_page = 1
     notify_completion()
     progress_bar.empty()  # Remove progress bar
     status_text.text("✅ Translations complete! 🎉")
 
     # Provide detailed response time breakdown:
-    st.write(f"⏱ DeepL translation took: {deepl_elapsed:.2f} seconds")
-    st.write(f"⏱ Google translation took: {google_elapsed:.2f} seconds")
+    for label, elapsed in hop_timings:
+        st.write(f"⏱ {label} translation took: {elapsed:.2f} seconds")
     st.write(f"📜 Total time taken: {total_elapsed:.2f} seconds for all translations")
 
+def handle_file_translation(uploaded_file):
+    """Streams an uploaded book through the chunker and appends each translated chunk to the result store.
 
+    Up to MAX_PARALLEL_CHUNKS chunks are translated at once; results are
+    still written in source order.
+    """
+    chunks = iter_chunks(iter_upload_lines(uploaded_file))
+    first_chunk = next(chunks, None)
+    if first_chunk is None or not first_chunk.strip():
+        st.warning("The uploaded file has no text to translate.")
+        return
 
+    try:
+        route = plan_translation(first_chunk, total_chars=uploaded_file.size)
+    except ValueError as e:
+        st.error(f"Translation failed: {str(e)}")
+        return
+
+    job_id = new_job_id()
+    langs = [hop["target"] for hop in route["hops"]]
+    job = {"id": job_id, "name": uploaded_file.name, "langs": langs, "chunks": 0, "complete": False}
+
+    st.session_state.processing = True
+    st.session_state.source_lang = route["source_lang"] or "auto"
+    discard_export_file()
+    st.session_state.job = None
+    st.session_state.reader_page = 1
+    show_route(route)
+
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    hedge = st.session_state.get("hedge_requests", False)
+    glossary = load_glossary()
+    start_time = time.time()
+
+    writer = ResultStoreWriter(job_id, ["source"] + langs)
+    # Keep a bounded window of chunks in flight and write them back in order
+    window = deque()
+
+    def write_next():
+        chunk, future = window.popleft()
+        translations, _ = future.result()
+        writer.write_aligned({"source": chunk, **translations})
+        job["chunks"] += 1
+        progress_bar.progress(min(99, int(uploaded_file.tell() * 100 / max(1, uploaded_file.size))))
+        status_text.text(f"📖 {job['chunks']} chunks translated ({time.time() - start_time:.0f} sec)")
+
+    try:
+        with st.spinner(f"Translating {uploaded_file.name}..."):
+            with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS, thread_name_prefix="upload-chunk") as executor:
+                for chunk in itertools.chain([first_chunk], chunks):
+                    window.append((chunk, executor.submit(run_route, route, chunk, glossary, hedge)))
+                    if len(window) >= MAX_PARALLEL_CHUNKS:
+                        write_next()
+                while window:
+                    write_next()
+    except Exception as e:
+        st.error(f"Translation failed after {job['chunks']} chunks (the finished part is kept): {str(e)}")
+        st.session_state.processing = False
+        return
+    finally:
+        writer.close()
+        set_job(job)
+
+    job["complete"] = True
+    save_job_info(job_id, job)
+    st.session_state.processing = False
+    notify_completion()
+    progress_bar.empty()
+    status_text.text(f"✅ {uploaded_file.name} translated in {time.time() - start_time:.2f} seconds 🎉")
+
+
+# Chapter Setup
+PREFETCH_CHAR_BUDGET = 200000  # billed characters one session may spend on prefetching
+PREFETCH_DEEPL_RESERVE = 50000  # never prefetch into the last part of the DeepL quota
+
+def split_chapters(lines):
+    """Returns (title, start, end) line ranges for each chapter heading in the lines."""
+    starts = []
+    total = 0
+    for total, line in enumerate(lines, start=1):
+        if CHAPTER_PATTERN.match(line):
+            starts.append((line.strip(), total - 1))
+    if not starts:
+        return []
+    starts[0] = (starts[0][0], 0)  # anything before the first heading belongs to chapter one
+    ends = [start for _, start in starts[1:]] + [total]
+    return [(title, start, end) for (title, start), end in zip(starts, ends)]
+
+def store_book(text):
+    """Saves pasted text to the result store and returns a book that pages through its chapters.
+
+    Returns None without storing anything when the text has fewer than two chapters.
+    """
+    chapters = split_chapters(text.split("\n"))
+    if len(chapters) < 2:
+        return None
+    book_id = new_job_id(prefix="book_")
+    writer = ResultStoreWriter(book_id, ["source"])
+    writer.write_text("source", text)
+    writer.close()
+    save_job_info(book_id, {"id": book_id, "chapters": chapters})
+    return {"id": book_id, "chapters": chapters, "index": 0}
+
+def chapter_text(index):
+    book = st.session_state.book
+    _, start, end = book["chapters"][index]
+    with StoredText(book["id"], "source") as stored:
+        return "\n".join(stored.read_lines(start, end))
+
+def set_book(book):
+    """Makes book the session's chapter book (or clears it) and records the position in the URL."""
+    st.session_state.book = book
+    if book:
+        st.query_params["book"] = book["id"]
+        st.query_params["chapter"] = str(book["index"])
+    else:
+        st.query_params.pop("book", None)
+        st.query_params.pop("chapter", None)
+
+def forget_missing_job():
+    """Drops a job whose store is gone: it expired, or another tab moved past that chapter."""
+    st.session_state.job = None
+    st.query_params.pop("job", None)
+    st.warning("⌛ These results are no longer stored. Translate the text again to see them.")
+
+def forget_missing_book():
+    set_book(None)
+    st.warning("⌛ This book is no longer stored. Translate it again to keep reading by chapter.")
+
+def restore_session_from_url():
+    """Reopens the job and book named in the URL, e.g. after a server restart or in a new tab."""
+    if st.session_state.job is None:
+        st.session_state.job = load_job_info(st.query_params.get("job"))
+    if st.session_state.book is None:
+        book = load_job_info(st.query_params.get("book"))
+        if book:
+            chapter = st.query_params.get("chapter", "0")
+            index = int(chapter) if chapter.isdigit() else 0
+            st.session_state.book = {**book, "index": min(index, len(book["chapters"]) - 1)}
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_pool():
+    """Small pool so background prefetches never crowd out interactive jobs."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+def prefetch_chapter(route, text, glossary):
+    """Warms the chunk cache for a chapter; the translations themselves are dropped."""
+    run_route(route, text, glossary, low_priority=True)
+
+def maybe_prefetch_next_chapter():
+    """Translates chapter N+1 at low priority while chapter N is being read.
+
+    The results land in the shared chunk cache, so opening the next chapter
+    only has to reassemble them. Stops at PREFETCH_CHAR_BUDGET per session
+    and when DeepL has less than PREFETCH_DEEPL_RESERVE characters left.
+    """
+    book = st.session_state.book
+    # Chapters already behind the reader (or from another book) are never needed again
+    st.session_state.prefetches = {
+        key: future for key, future in st.session_state.prefetches.items()
+        if key[0] == book["id"] and key[1] >= book["index"]
+    }
+    next_index = book["index"] + 1
+    if next_index >= len(book["chapters"]):
+        return
+    title = book["chapters"][next_index][0]
+    next_text = chapter_text(next_index)
+    try:
+        route = plan_translation(next_text)
+    except ValueError:
+        return
+    # A different source language, target set, route or glossary makes the cached chunks stale, so prefetch again
+    glossary_entries = parse_glossary(st.session_state.get("glossary_text", ""))
+    key = (
+        book["id"], next_index, route["source_lang"],
+        tuple((hop["target"], hop["engine"], hop["input"]) for hop in route["hops"]),
+        glossary_version(glossary_entries) if glossary_entries else None,
+    )
+    future = st.session_state.prefetches.get(key)
+
+    if future is None:
+        if st.session_state.prefetch_chars + route["billed_chars"] > PREFETCH_CHAR_BUDGET:
+            st.caption("⏸ Prefetch paused: quota ceiling reached for this session")
+            return
+        if any(hop["engine"] == "deepl" for hop in route["hops"]):
+            remaining = get_deepl_remaining()
+            if remaining is not None and remaining - route["billed_chars"] < PREFETCH_DEEPL_RESERVE:
+                st.caption("⏸ Prefetch paused: DeepL quota is running low")
+                return
+        st.session_state.prefetch_chars += route["billed_chars"]
+        future = get_prefetch_pool().submit(prefetch_chapter, route, next_text, load_glossary())
+        st.session_state.prefetches[key] = future
+
+    if not future.done():
+        st.caption(f"⏳ Prefetching {title}...")
+    elif future.exception():
+        st.caption("⚠️ Prefetch failed; the chapter will be translated when opened")
+    else:
+        st.caption(f"⚡ {title} is ready")
+
+def render_chapter_nav():
+    """Previous/next chapter controls for a book translated one chapter at a time."""
+    book = st.session_state.book
+    index = book["index"]
+    cols = st.columns([1, 3, 1])
+    with cols[0]:
+        go_prev = st.button("◀ Chapter", disabled=index <= 0, use_container_width=True)
+    with cols[2]:
+        go_next = st.button("Chapter ▶", disabled=index >= len(book["chapters"]) - 1, use_container_width=True)
+    if go_prev or go_next:
+        book["index"] = index - 1 if go_prev else index + 1
+    with cols[1]:
+        st.caption(f"📚 {book['chapters'][book['index']][0]} ({book['index'] + 1}/{len(book['chapters'])})")
+    if go_prev or go_next:
+        st.query_params["chapter"] = str(book["index"])
+        previous_job = st.session_state.job
+        handle_translation(chapter_text(book["index"]))
+        # Chapters are cheap to rebuild from the chunk cache, so only the open one is kept
+        if previous_job and previous_job is not st.session_state.job:
+            delete_store(previous_job["id"])
+
+# Export Setup
+EXPORT_DIR = os.path.join(OUTPUT_DIR, "exports")
+EXPORT_FORMATS = {
+    "Text": ("txt", "text/plain"),
+    "Text (one language)": ("txt", "text/plain"),
+    "HTML": ("html", "text/html"),
+    "Paginated HTML": ("zip", "application/zip"),
+    "EPUB": ("epub", "application/epub+zip"),
+}
+PAGE_PARAGRAPHS = 300  # upper bound per exported page, even inside one long chapter
+CHAPTER_NUMBER = (
+    r"(\d+|(?=[ivxlc])c{0,3}(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})"
+    r"|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)(?!\w)"
+)
+CHAPTER_PATTERN = re.compile(
+    rf"^\s*((chapter|chương)\s+{CHAPTER_NUMBER}|第\s*[\d一二三四五六七八九十百千零〇]+\s*[章回节話话])", re.IGNORECASE
+)
+PAGE_STYLE = """
+body { font-family: 'Arial', sans-serif; background: #2C3E50; color: #E0E0E0; margin: 0 auto; padding: 20px; max-width: 1200px; line-height: 1.6; }
+nav { display: flex; justify-content: space-between; margin: 10px 0; }
+a { color: #C0A3E5; }
+table { width: 100%; border-collapse: collapse; table-layout: fixed; }
+th { color: #C0A3E5; border-bottom: 2px solid #7D4F95; text-align: left; }
+td { vertical-align: top; padding: 6px 10px; border-bottom: 1px solid rgba(125, 79, 149, 0.3); }
+"""
+
+def export_languages():
+    """Translated languages of the current job, for either pasted text or an uploaded book."""
+    job = st.session_state.get("job")
+    return list(job["langs"]) if job else []
+
+def open_export_lines(lang):
+    """Yields the lines of the source ('source') or a translation from the result store."""
+    with StoredText(st.session_state.job["id"], lang) as stored:
+        yield from stored.iter_lines()
+
+def iter_aligned_rows(langs):
+    """Pairs line N of the source with line N of every translation, skipping blank rows."""
+    for row in itertools.zip_longest(*(open_export_lines(lang) for lang in ["source"] + langs), fillvalue=""):
+        if any(cell.strip() for cell in row):
+            yield row
+
+def iter_export_pages(rows):
+    """Groups aligned rows into (title, rows) pages at chapter headings or every PAGE_PARAGRAPHS rows."""
+    page = []
+    title = None
+    number = 1
+    for row in rows:
+        heading = CHAPTER_PATTERN.match(row[0])
+        if page and (heading or len(page) >= PAGE_PARAGRAPHS):
+            yield title or f"Page {number}", page
+            page, title = [], None
+            number += 1
+        if heading and title is None:
+            title = row[-1].strip() or row[0].strip()
+        page.append(row)
+    if page:
+        yield title or f"Page {number}", page
+
+def write_paginated_html(path, langs):
+    """Writes a zip of paragraph-aligned HTML pages plus an index, one page at a time."""
+    titles = []
+    headers = "".join(f"<th>{LANG_NAMES.get(lang, 'Original')}</th>" for lang in ["source"] + langs)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        pages = iter_export_pages(iter_aligned_rows(langs))
+        page_ahead = next(pages, None)
+        number = 0
+        while page_ahead is not None:
+            (title, rows), page_ahead = page_ahead, next(pages, None)
+            number += 1
+            titles.append(title)
+            with archive.open(f"page_{number:04d}.html", "w") as page_file:
+                page = io.TextIOWrapper(page_file, encoding="utf-8")
+                page.write(f"<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>{html.escape(title)}</title><style>{PAGE_STYLE}</style></head><body>")
+                nav = (f"<a href=\"page_{number - 1:04d}.html\">← Previous</a>" if number > 1 else "<span></span>") + \
+                    "<a href=\"index.html\">Contents</a>" + \
+                    (f"<a href=\"page_{number + 1:04d}.html\">Next →</a>" if page_ahead else "<span></span>")
+                page.write(f"<nav>{nav}</nav><h1>{html.escape(title)}</h1><table><tr>{headers}</tr>")
+                for row in rows:
+                    page.write("<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in row) + "</tr>\n")
+                page.write(f"</table><nav>{nav}</nav></body></html>")
+                page.detach()
+
+        contents = "".join(f"<li><a href=\"page_{number:04d}.html\">{html.escape(title)}</a></li>" for number, title in enumerate(titles, start=1))
+        archive.writestr("index.html", f"<!DOCTYPE html><html><head><meta charset=\"UTF-8\"><title>Translation Report</title><style>{PAGE_STYLE}</style></head><body><h1>Translation Report</h1><ol>{contents}</ol></body></html>")
+
+def write_epub(path, lang, book_title="Translation"):
+    """Writes an EPUB 3 book in the chosen language, one chapter document at a time."""
+    titles = []
+    lang_index = (["source"] + export_languages()).index(lang)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as book:
+        book.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        book.writestr("META-INF/container.xml", """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>""")
+
+        for number, (title, rows) in enumerate(iter_export_pages(iter_aligned_rows(export_languages())), start=1):
+            titles.append(title)
+            with book.open(f"OEBPS/chapter_{number:04d}.xhtml", "w") as chapter_file:
+                chapter = io.TextIOWrapper(chapter_file, encoding="utf-8")
+                chapter.write(f"<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n<html xmlns=\"http://www.w3.org/1999/xhtml\"><head><title>{html.escape(title)}</title></head><body>\n")
+                for row in rows:
+                    if row[lang_index].strip():
+                        chapter.write(f"<p>{html.escape(row[lang_index])}</p>\n")
+                chapter.write("</body></html>")
+                chapter.detach()
+
+        chapter_ids = [f"chapter_{number:04d}" for number in range(1, len(titles) + 1)]
+        nav_items = "".join(f"<li><a href=\"{chapter_id}.xhtml\">{html.escape(title)}</a></li>" for chapter_id, title in zip(chapter_ids, titles))
+        book.writestr("OEBPS/nav.xhtml", f"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"><head><title>Contents</title></head>
+<body><nav epub:type="toc"><ol>{nav_items}</ol></nav></body></html>""")
+        manifest = "".join(f"<item id=\"{chapter_id}\" href=\"{chapter_id}.xhtml\" media-type=\"application/xhtml+xml\"/>" for chapter_id in chapter_ids)
+        spine = "".join(f"<itemref idref=\"{chapter_id}\"/>" for chapter_id in chapter_ids)
+        book.writestr("OEBPS/content.opf", f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="book-id">urn:uuid:{uuid.uuid4()}</dc:identifier>
+<dc:title>{html.escape(book_title)}</dc:title>
+<dc:language>{lang if lang != "source" else "und"}</dc:language>
+<meta property="dcterms:modified">{datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}</meta>
+</metadata>
+<manifest><item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>{manifest}</manifest>
+<spine>{spine}</spine>
+</package>""")
+
+def write_export_file(export_format, book_lang=None):
+    """Streams the chosen export format to a file under EXPORT_DIR and returns its path."""
+    file_ext, _ = EXPORT_FORMATS[export_format]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"translations_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.{file_ext}")
+    try:
+        if export_format == "Paginated HTML":
+            write_paginated_html(path, export_languages())
+        elif export_format == "EPUB":
+            write_epub(path, book_lang or export_languages()[-1])
+        elif export_format == "Text (one language)":
+            with open(path, "w", encoding="utf-8") as export_file:
+                for line in open_export_lines(book_lang or export_languages()[-1]):
+                    export_file.write(line + "\n")
+        else:
+            with open(path, "w", encoding="utf-8") as export_file:
+                for piece in generate_export_content(file_ext):
+                    export_file.write(piece)
+    except BaseException:
+        # Don't leave half-written exports behind, e.g. when the job's store was deleted
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
+
+def discard_export_file():
+    """Deletes the session's prepared export, if any, so old exports don't pile up on disk."""
+    export_file = st.session_state.get("export_file")
+    st.session_state.export_file = None
+    if export_file and os.path.exists(export_file["path"]):
+        os.remove(export_file["path"])
+
+def render_export_controls():
+    """Export UI: files are only generated when the user asks for them."""
+    export_format = st.selectbox("Choose export format", list(EXPORT_FORMATS))
+    book_lang = None
+    if export_format in ("EPUB", "Text (one language)"):
+        book_lang = st.selectbox(
+            "Book language",
+            export_languages() + ["source"],
+            format_func=lambda code: LANG_NAMES.get(code, "Original")
+        )
+
+    # A job's results never change, so an export of the same job and format is reused.
+    # The download button only appears right after preparing, because it reads the whole file into memory.
+    request = {"job": st.session_state.job["id"], "format": export_format, "lang": book_lang}
+    if st.button("🛠 Prepare export", use_container_width=True):
+        export_file = st.session_state.get("export_file")
+        if not (export_file and export_file["request"] == request and os.path.exists(export_file["path"])):
+            discard_export_file()
+            with st.spinner("Writing export..."):
+                export_file = {"path": write_export_file(export_format, book_lang), "request": request}
+            st.session_state.export_file = export_file
+
+        _, mime_type = EXPORT_FORMATS[export_format]
+        with open(export_file["path"], "rb") as export_stream:
+            st.download_button(
+                label="📥 Export Translations",
+                data=export_stream,
+                file_name=os.path.basename(export_file["path"]),
+                mime=mime_type,
+                use_container_width=True
+            )
+
+# Reader Setup
+READER_PAGE_SIZES = [20, 50, 100]
+
+def read_aligned_window(job_id, langs, first_row, count):
+    """Returns (paragraph number, {lang: text}) for a window of aligned rows from the result store."""
+    window_rows = read_store_rows(job_id, first_row, count)
+    if not window_rows:
+        return []
+    start, stop = window_rows[0], window_rows[-1] + 1
+    lines = {}
+    for lang in langs:
+        with StoredText(job_id, lang) as stored:
+            lines[lang] = stored.read_lines(start, stop)
+    return [
+        (first_row + position + 1, {lang: lines[lang][row - start] if row - start < len(lines[lang]) else "" for lang in langs})
+        for position, row in enumerate(window_rows)
+    ]
+
+def turn_reader_page(step):
+    st.session_state.reader_page = max(1, st.session_state.reader_page + step)
+
+def render_reader(langs):
+    """Paragraph-aligned reader that only sends the visible page of paragraphs to the browser."""
+    job_id = st.session_state.job["id"]
+    total_rows = store_row_count(job_id)
+
+    controls = st.columns([1, 1, 2, 1, 1])
+    with controls[0]:
+        page_size = st.selectbox("Paragraphs", READER_PAGE_SIZES, key="reader_page_size", label_visibility="collapsed")
+    total_pages = max(1, -(-total_rows // page_size))
+    st.session_state.reader_page = min(st.session_state.get("reader_page", 1), total_pages)
+    # Page changes run as callbacks, before the buttons' disabled state is worked out
+    with controls[1]:
+        st.button("◀ Prev", disabled=st.session_state.reader_page <= 1, use_container_width=True,
+                  on_click=turn_reader_page, args=(-1,))
+    with controls[3]:
+        st.button("Next ▶", disabled=st.session_state.reader_page >= total_pages, use_container_width=True,
+                  on_click=turn_reader_page, args=(1,))
+    with controls[2]:
+        st.caption(f"Page {st.session_state.reader_page} / {total_pages} · {total_rows:,} paragraphs")
+    with controls[4]:
+        show_source = st.toggle("Original", key="reader_show_source")
+
+    columns = (["source"] if show_source else []) + langs
+    window = read_aligned_window(job_id, columns, (st.session_state.reader_page - 1) * page_size, page_size)
+    header = "".join(f"<th>{LANG_NAMES.get(lang, 'Original')}</th>" for lang in columns)
+    body = "".join(
+        f"<tr><td class='reader-number'>{number}</td>"
+        + "".join(f"<td>{html.escape(cells[lang])}</td>" for lang in columns)
+        + "</tr>"
+        for number, cells in window
+    )
+    st.markdown(
+        "<style>.reader-table {width: 100%; table-layout: fixed;} .reader-table td {vertical-align: top;}"
+        " .reader-number {width: 3em; color: #777;}</style>"
+        f"<table class='reader-table'><tr><th class='reader-number'>#</th>{header}</tr>{body}</table>",
+        unsafe_allow_html=True
+    )
 
 def generate_export_content(format="txt"):
-    """Generate export content in text or themed HTML format."""
+    """Generate export content in text or themed HTML format, yielded piece by piece."""
+    langs = export_languages()
     if format == "txt":
-        content = [
-            "=== Original Text ===",
-            st.session_state.get("source_text", "No source text available"),
-            "\n=== English Translation ===",
-            st.session_state.translations.get("en", "No translation available"),
-            "\n=== Vietnamese Translation ===",
-            st.session_state.translations.get("vi", "No translation available")
-        ]
-        return "\n".join(content)
+        for lang in ["source"] + langs:
+            yield "=== Original Text ===\n" if lang == "source" else f"\n=== {LANG_NAMES[lang]} Translation ===\n"
+            for line in open_export_lines(lang):
+                yield line + "\n"
 
     elif format == "html":
-        html_content = """
+        html_template = """
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -323,14 +1670,7 @@ def generate_export_content(format="txt"):
         </div>
         <h1>Translation Report</h1>
         <div class="container">
-            <div class="box">
-                <h2>English Translation</h2>
-                <div id="en" contenteditable="false">{en}</div>
-            </div>
-            <div class="box">
-                <h2>Vietnamese Translation</h2>
-                <div id="vi" contenteditable="false">{vi}</div>
-            </div>
+            {boxes}
         </div>
         <div class="original-text">
             <h2>Original Text</h2>
@@ -353,11 +1693,10 @@ def generate_export_content(format="txt"):
             }}
 
             function saveContent() {{
-                const content = {{
-                    en: document.getElementById('en').innerText,
-                    vi: document.getElementById('vi').innerText,
-                    source: document.getElementById('source').innerText
-                }};
+                const content = {{}};
+                document.querySelectorAll('[contenteditable]').forEach(element => {{
+                    content[element.id] = element.innerText;
+                }});
 
                 // Create downloadable file
                 const blob = new Blob([JSON.stringify(content, null, 2)], {{ type: 'text/plain' }});
@@ -371,19 +1710,44 @@ def generate_export_content(format="txt"):
         </script>
         </body>
         </html>
-        """.format(
-            en=st.session_state.translations.get("en", "No translation available"),
-            vi=st.session_state.translations.get("vi", "No translation available"),
-            source=st.session_state.get("source_text", "No source text available")
-        )
+        """
+        head, rest = html_template.split("{boxes}")
+        middle, tail = rest.split("{source}")
 
-        return html_content
+        yield head.format()
+        for lang in langs:
+            yield f'''
+            <div class="box">
+                <h2>{LANG_NAMES[lang]} Translation</h2>
+                <div id="{lang}" contenteditable="false">'''
+            for line in open_export_lines(lang):
+                yield html.escape(line) + "\n"
+            yield "</div>\n            </div>"
+        yield middle.format()
+        for line in open_export_lines("source"):
+            yield html.escape(line) + "\n"
+        yield tail.format()
 
 def get_google_usage():
     return "N/A (Google does not provide direct usage stats)"
 
 locale.setlocale(locale.LC_ALL, '')
 
+@st.cache_data(ttl=300, show_spinner=False)
+def get_deepl_remaining():
+    """Remaining DeepL characters, or None if the usage endpoint can't be reached."""
+    try:
+        response = requests.get(
+            "https://api-free.deepl.com/v2/usage",
+            headers={"Authorization": f"DeepL-Auth-Key {os.getenv('DEEPL_API_KEY')}"},
+            timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data['character_limit'] - data['character_count']
+    except Exception:
+        return None
+
 def get_deepl_usage():
     try:
         response = requests.get(
@@ -429,7 +1793,37 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### ⚙️ Translation Setup")
     st.markdown("- **DeepL** → Translates text **to English**.")
-    st.markdown("- **Google Translate** → Converts **English to Vietnamese**.")
+    st.markdown("- **Google Translate** → Converts to **Vietnamese** and the other targets.")
+    st.markdown("- English or Vietnamese sources **skip the hop** they don't need.")
+    st.markdown("- Other target languages are translated **directly from the source** when that bills fewer characters.")
+
+    st.checkbox(
+        "⏩ Prefetch next chapter in Reading Mode",
+        key="prefetch_next",
+        help=f"Translates the next chapter in the background at low priority, up to {PREFETCH_CHAR_BUDGET:,} characters per session."
+    )
+    st.checkbox(
+        "🎯 Prefer quality over cost",
+        key="prefer_quality",
+        help="Always pivot through DeepL's English for the other targets. Usually better for CJK novels, but bills the source characters twice."
+    )
+    st.checkbox(
+        "⚡ Hedge slow requests",
+        key="hedge_requests",
+        help="Send a duplicate request when a chunk takes longer than the recent p95 latency. Faster tails, slightly more quota."
+    )
+
+    st.markdown("---")
+    st.markdown("### 📖 Glossary")
+    st.text_area(
+        "One term per line: `source = translation`",
+        key="glossary_text",
+        height=150,
+        help="Names and terms listed here are kept consistent across both DeepL and Google."
+    )
+    glossary_count = len(parse_glossary(st.session_state.glossary_text))
+    if glossary_count:
+        st.caption(f"🔒 {glossary_count} glossary terms will be protected")
 
     st.markdown("---")
     st.markdown("### 🧠 Language Fun Fact of the Day")
@@ -450,6 +1844,8 @@ with st.sidebar:
     st.success("🚀 **You're all set! Let's start translating!**")
 
 # Main Interface
+restore_session_from_url()
+
 if "quick_view" not in st.session_state:
     st.session_state.quick_view = False
 
@@ -470,66 +1866,88 @@ if not st.session_state.quick_view:
 if not st.session_state.quick_view:
     with st.container():
         input_text = st.text_area("Enter your text:", key="input_text", height=200)
+        uploaded_file = st.file_uploader(
+            "Or upload a book (.txt, .epub, .html)",
+            type=UPLOAD_TYPES,
+            help="Large files are translated chunk by chunk and written to disk as they go."
+        )
+        st.selectbox(
+            "Source language",
+            ["auto"] + list(LANG_NAMES),
+            format_func=lambda code: "Auto-detect" if code == "auto" else LANG_NAMES[code],
+            key="source_lang_choice"
+        )
+        st.multiselect(
+            "Target languages",
+            SUPPORTED_LANGS,
+            format_func=lambda code: LANG_NAMES[code],
+            key="target_langs",
+            help="Targets are translated concurrently, directly from the source unless quality is preferred over cost."
+        )
+        st.checkbox(
+            "📚 Translate one chapter at a time",
+            key="chapter_mode",
+            help="Splits the text at chapter headings and translates only the chapter you are reading."
+        )
+        if input_text.strip():
+            try:
+                planned = plan_translation(input_text)
+                st.caption(f"🧭 Planned route: {planned['name']} ({describe_route(planned)})")
+            except ValueError as e:
+                st.caption(f"⚠️ {str(e)}")
         translate_btn = st.button(
             "Translate",
-            disabled=not (DEEPL_API_KEY and translate.Client.from_service_account_json('google-credentials.json')),
+            disabled=not (DEEPL_API_KEY or os.path.exists('google-credentials.json')),
             use_container_width=True
         )
 
-    if translate_btn and input_text:
-        handle_translation(input_text)
+    if translate_btn and uploaded_file is not None:
+        set_book(None)
+        handle_file_translation(uploaded_file)
+    elif translate_btn and input_text:
+        book = store_book(input_text) if st.session_state.chapter_mode else None
+        set_book(book)
+        handle_translation(chapter_text(0) if book else input_text)
+
+if st.session_state.get("book"):
+    try:
+        render_chapter_nav()
+    except FileNotFoundError:
+        forget_missing_book()
 
 # Translation display (works in both modes)
-if st.session_state.get("translations"):
+job = st.session_state.get("job")
+if job and job["name"]:
+    status = "✅ complete" if job["complete"] else "⚠️ partial"
+    st.markdown(f"### 📖 {job['name']} ({status}, {job['chunks']} chunks)")
+
+if export_languages():
     # View mode selector
+    lang_map = {f"{LANG_NAMES[lang]} Only": lang for lang in export_languages()}
+    view_options = ["Side by Side"] + list(lang_map)
+    if st.session_state.view_mode not in view_options:
+        st.session_state.view_mode = "Side by Side"
     view_mode = st.selectbox(
         "Display Mode",
-        ["Side by Side", "English Only","Vietnamese Only"],
-        index=0,
+        view_options,
         key="view_mode"
     )
 
     # Update translation display logic
-    if view_mode == "Side by Side":
-        cols = st.columns(2)
-        with cols[0]:
-            st.markdown("### English")
-            st.text_area("", value=st.session_state.translations.get("en", ""), height=300)
-        with cols[1]:
-            st.markdown("### Vietnamese (Refined)")
-            st.text_area("", value=st.session_state.translations.get("vi", ""), height=300)
-    else:
-        lang_map = {
-            "English Only": "en",
-            "Vietnamese Only": "vi",
-        }
-        selected_lang = lang_map[view_mode]
-        st.text_area(
-            "",
-            value=st.session_state.translations.get(selected_lang, ""),
-            height=400
-        )
-    # Button to choose format
-    export_format = st.selectbox("Choose export format", ["Text", "HTML"])
-
-    # Determine file extension and MIME type
-    if export_format == "Text":
-        file_content = generate_export_content("txt")
-        file_ext = "txt"
-        mime_type = "text/plain"
-    elif export_format == "HTML":
-        file_content = generate_export_content("html")
-        file_ext = "html"
-        mime_type = "text/html"
-
-    # Export button
-    st.download_button(
-        label="📥 Export Translations",
-        data=file_content,
-        file_name=f"translations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_ext}",
-        mime=mime_type,
-        use_container_width=True
-    )
+    try:
+        if view_mode == "Side by Side":
+            render_reader(export_languages())
+        else:
+            render_reader([lang_map[view_mode]])
+        render_export_controls()
+    except FileNotFoundError:
+        forget_missing_job()
+
+    if st.session_state.quick_view and st.session_state.prefetch_next and st.session_state.get("book"):
+        try:
+            maybe_prefetch_next_chapter()
+        except FileNotFoundError:
+            forget_missing_book()
 
 # Empty state for normal mode
 elif not st.session_state.quick_view: